@@ -1,25 +1,424 @@
 import hmac
 import hashlib
+import gzip
 import json
+import math
 import uuid
-import random
+import os
 import time
+import shelve
+import logging
+import asyncio
+import threading
+import itertools
+import operator
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from secrets import randbits
 import requests
+from requests.adapters import HTTPAdapter
+
+__version__ = '0.1.0'
+
+logger = logging.getLogger(__name__)
+
+try:
+    import _hashlib
+except ImportError:
+    _hashlib = None
+
+# OpenSSL dispatches SHA-256 to SHA-NI / ARMv8 SHA2 instructions when the
+# CPU has them, which makes request signing several times cheaper than the
+# builtin fallback implementation.
+if _hashlib is not None and isinstance(hashlib.sha256(), _hashlib.HASH):
+    logger.debug("HMAC-SHA256 signing uses OpenSSL")
+else:
+    logger.warning("hashlib is not backed by OpenSSL; request signing uses the slower builtin SHA-256")
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import jiter
+except ImportError:
+    jiter = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _dumps(obj):
+    '''Serialize obj to JSON bytes, using orjson when it is installed'''
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data):
+    '''Parse JSON bytes, using jiter or orjson when they are installed'''
+    if jiter is not None:
+        return jiter.from_json(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+API_URL = 'https://api.coinut.com'
+
+# one nonce source for every client in the process. next() on
+# itertools.count is atomic under the GIL, so requests from any thread or
+# client in this process never share a nonce. Seeding from the clock in
+# nanoseconds starts a restarted process at a different point than the
+# previous one instead of replaying its sequence.
+_nonce_counter = itertools.count(time.time_ns())
+
+# every client shares the same shelve file by default, and the dbm backends
+# shelve may pick are not safe with concurrent writers
+_cache_lock = threading.Lock()
+
+
+class RateLimitError(Exception):
+    '''Raised instead of sending a request that would exceed the client-side rate limit'''
+
+
+class _TokenBucket():
+    '''Thread-safe token bucket allowing rate requests per second on average'''
+
+    def __init__(self, rate, burst = None):
+        self.rate = float(rate)
+        # a bucket that cannot hold one whole token would reject every request
+        self.capacity = max(1.0, float(burst if burst is not None else rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                raise RateLimitError("more than %g requests per second" % self.rate)
+            self.tokens -= 1
+
+
+def _is_positive(x):
+    '''Whether x is finite and still positive after rounding to the 8 decimals sent to the exchange'''
+    return math.isfinite(x) and float(format(x, '.8f')) > 0
+
+
+def _check_order(inst_id, side, qty, price):
+    '''Raise ValueError for an order the exchange would reject anyway'''
+    try:
+        valid = not isinstance(inst_id, bool) and operator.index(inst_id) > 0
+    except TypeError:
+        valid = False
+    if not valid:
+        raise ValueError("invalid inst_id: %r" % (inst_id,))
+    if side not in ('BUY', 'SELL'):
+        raise ValueError("side must be 'BUY' or 'SELL', not %r" % (side,))
+    if not _is_positive(qty):
+        raise ValueError("qty must be finite and at least 0.00000001, not %r" % (qty,))
+    if price is not None and not _is_positive(price):
+        raise ValueError("price must be finite and at least 0.00000001, not %r" % (price,))
+
+
+def _check_orderbook(reply):
+    '''Raise ValueError carrying reply when it is an error instead of an orderbook'''
+    if not isinstance(reply, dict):
+        raise ValueError(reply)
+    status = reply.get('status')
+    if (status is not None and 'OK' not in status) or ('buy' not in reply and 'sell' not in reply):
+        raise ValueError(reply)
+
+
+def _resolve_orders(batch, result):
+    '''Resolve the futures of a batch of (order, future) pairs from a new_orders reply'''
+    replies = {}
+    if isinstance(result, list):
+        for reply in result:
+            cid = reply.get('client_ord_id')
+            if cid is None and isinstance(reply.get('order'), dict):
+                cid = reply['order'].get('client_ord_id')
+            replies[cid] = reply
+    for order, future in batch:
+        # an asyncio future may have been cancelled while the batch was in flight
+        if not future.done():
+            future.set_result(replies.get(order['client_ord_id'], result))
+
+
+def _parse_decimals(buf, n):
+    '''Parse n comma separated unsigned decimals from a uint8 array
+
+    Returns a (values, ok) tuple. ok is False, and values must not be used,
+    when the input holds anything but plain decimals such as "0.01311":
+    signs, exponents, empty fields or more than 15 digits, beyond which the
+    digit loop could no longer match float() exactly.
+    '''
+    out = np.empty(n, np.float64)
+    k = 0
+    mantissa = 0
+    digits = 0
+    scale = 1.0
+    fraction = False
+    for c in buf:
+        if c == 44:  # ','
+            if digits == 0 or k == n - 1:
+                return out, False
+            out[k] = mantissa / scale
+            k += 1
+            mantissa = 0
+            digits = 0
+            scale = 1.0
+            fraction = False
+        elif c == 46:  # '.'
+            if fraction:
+                return out, False
+            fraction = True
+        elif 48 <= c <= 57:  # '0'..'9'
+            if digits == 15:
+                return out, False
+            mantissa = mantissa * 10 + (int(c) - 48)
+            digits += 1
+            if fraction:
+                scale *= 10.0
+        else:
+            return out, False
+    if digits == 0 or k != n - 1:
+        return out, False
+    out[k] = mantissa / scale
+    return out, True
+
+if numba is not None:
+    _parse_decimals = numba.njit(cache=True)(_parse_decimals)
+
+
+def _levels_to_array(levels):
+    '''Convert orderbook levels into an (N, 2) float64 array of price and qty'''
+    n = len(levels)
+    if numba is not None and n > 0:
+        try:
+            buf = ','.join([x for l in levels for x in (l['price'], l['qty'])]).encode('ascii')
+        except (TypeError, UnicodeEncodeError):
+            buf = None
+        if buf is not None:
+            values, ok = _parse_decimals(np.frombuffer(buf, np.uint8), 2 * n)
+            if ok:
+                return values.reshape(n, 2)
+    # numpy parses whatever the kernel rejected, and raises on real garbage
+    return np.array([(l['price'], l['qty']) for l in levels],
+                    dtype=np.float64).reshape(n, 2)
 
 
 class CoinutAPI():
     '''REST API for https://coinut.com. More documents can be find at https://github.com/coinut/api/wiki'''
 
-    def __init__(self, user = None, api_key = None):
+    # AsyncCoinutAPI inherits every method that returns self.request(...) or
+    # self._post(...) unchanged, because there those calls return coroutines.
+    # A method that post-processes a reply must be overridden in
+    # AsyncCoinutAPI as well, or it breaks on the async client.
+
+    # how long, in seconds, the instrument list is reused before it is fetched again
+    INST_CACHE_TTL = 300
+
+    # how long, in seconds, the instrument list stored on disk stays valid
+    DISK_CACHE_TTL = 86400
+
+    # the exchange accepts at most this many orders in one new_orders request
+    MAX_ORDER_BATCH = 1000
+
+    # connections kept per host; fan-out helpers never use more threads than this
+    POOL_MAXSIZE = 50
+
+    # request bodies larger than this many bytes are gzipped when compress_requests is set
+    COMPRESS_MIN_SIZE = 1024
+
+    def __init__(self, user = None, api_key = None, use_http2 = False,
+                 cache_dir = '~/.cache/coinut_api', rate_limit = None,
+                 compress_requests = False):
         '''Initialize the API
 
         Args:
             user (str): your username
             api_key (str): your REST API Key on https://coinut.com/account/settings
+            use_http2 (bool): send requests over a multiplexed HTTP/2
+            connection. It requires httpx with the http2 extra
+            (pip install 'httpx[http2]').
+            cache_dir (str): directory where the instrument list is cached
+            between runs. Use None to disable the disk cache.
+            rate_limit (float): the maximum number of requests per second.
+            Requests over the limit raise RateLimitError without being
+            sent. None disables the limit; otherwise it must be positive.
+            compress_requests (bool): gzip request bodies larger than
+            COMPRESS_MIN_SIZE bytes, such as big order batches. The
+            signature is computed over the uncompressed JSON. Only enable
+            it if the exchange accepts Content-Encoding: gzip.
         '''
         self.user = user
         self.api_key = api_key
 
+        # the keyed HMAC state is built once and copied for every request
+        self._hmac_template = None
+        self._key_fingerprint = None
+        if api_key is not None:
+            if isinstance(api_key, str):
+                api_key = api_key.encode('utf-8')
+            self._key_fingerprint = hashlib.sha256(api_key).hexdigest()[:16]
+            if user is not None:
+                # passing the digest by name lets hmac pick the OpenSSL HMAC
+                self._hmac_template = hmac.new(api_key, digestmod='sha256')
+
+        # headers that are the same for every request live on the session
+        headers = {'Content-Type': 'application/json',
+                   'Accept-Encoding': 'gzip, deflate',
+                   'User-Agent': 'coinut-python/%s' % __version__}
+        if self._hmac_template is not None:
+            headers['X-USER'] = user
+
+        self._open_transport(headers, use_http2)
+
+        self._inst_cache = None
+        self._inst_cache_time = 0
+        self._cache_path = None
+        if cache_dir is not None:
+            self._cache_path = os.path.join(os.path.expanduser(cache_dir), 'cache')
+
+        self._rate_limiter = None
+        if rate_limit is not None:
+            if not rate_limit > 0:
+                raise ValueError("rate_limit must be positive, not %r" % (rate_limit,))
+            self._rate_limiter = _TokenBucket(rate_limit)
+        self._compress_requests = compress_requests
+
+        self._pending_orders = deque()
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
+
+    def _open_transport(self, headers, use_http2):
+        # exactly one of _session and _client is used; the other stays None
+        self._session = None
+        self._client = None
+        if use_http2:
+            if httpx is None:
+                raise ImportError("use_http2 requires httpx: pip install 'httpx[http2]'")
+            self._client = httpx.Client(
+                http2=True,
+                headers=headers,
+                limits=httpx.Limits(max_connections=100,
+                                    max_keepalive_connections=20),
+                timeout=5.0)
+            return
+
+        # keep-alive connections are reused across calls instead of paying
+        # a TCP+TLS handshake on every request
+        self._session = requests.Session()
+        self._session.headers.update(headers)
+        self._session.mount('https://', HTTPAdapter(pool_connections=10,
+                                                    pool_maxsize=self.POOL_MAXSIZE,
+                                                    max_retries=3))
+
+    def close(self):
+        '''Submit any batched orders and close the underlying HTTP connections'''
+        self.flush()
+        if self._session is not None:
+            self._session.close()
+        if self._client is not None:
+            self._client.close()
+
+    def refresh_instruments(self):
+        '''Drop the cached instrument list so the next lookup fetches it again'''
+        self._inst_cache = None
+        self._inst_cache_time = 0
+        self._write_disk_cache('inst_list:SPOT', None)
+
+    def _read_disk_cache(self, key):
+        '''Return the value stored under key on disk, or None if it is missing or expired
+
+        Entries written by another library version are treated as missing.
+        The stored key fingerprint is informational only: inst_list is
+        public, so clients with different keys share the entry.
+        '''
+        if self._cache_path is None:
+            return None
+        try:
+            with _cache_lock, shelve.open(self._cache_path, 'r') as db:
+                entry = db.get(key)
+        except Exception:
+            return None
+        if (entry is None
+                or entry.get('version') != __version__
+                or time.time() - entry['timestamp'] > self.DISK_CACHE_TTL):
+            return None
+        return entry['result']
+
+    def _cached_instruments(self):
+        '''Return the instrument list from the memory or disk cache, or None'''
+        if self._inst_cache is not None:
+            if time.time() - self._inst_cache_time <= self.INST_CACHE_TTL:
+                return self._inst_cache
+            # the disk only seeds a fresh client; once the memory copy has
+            # expired the list is fetched again so new listings show up
+            return None
+        result = self._read_disk_cache('inst_list:SPOT')
+        if result is not None:
+            self._inst_cache = result
+            self._inst_cache_time = time.time()
+        return result
+
+    def _store_instruments(self, result):
+        '''Cache a freshly fetched instrument list and return it
+
+        Error replies have no 'SPOT' key; they are returned but not cached,
+        so the next lookup asks the exchange again.
+        '''
+        if 'SPOT' in result:
+            self._write_disk_cache('inst_list:SPOT', result)
+            self._inst_cache = result
+            self._inst_cache_time = time.time()
+        return result
+
+    def _write_disk_cache(self, key, result):
+        '''Store result under key on disk together with its metadata; None deletes the key'''
+        if self._cache_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+            with _cache_lock, shelve.open(self._cache_path) as db:
+                if result is None:
+                    db.pop(key, None)
+                else:
+                    db[key] = {'timestamp': time.time(),
+                               'key_fingerprint': self._key_fingerprint,
+                               'version': __version__,
+                               'result': result}
+        except Exception as e:
+            logger.warning("cannot write the cache at %s: %s", self._cache_path, e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def get_balance(self):
         '''Get my balance
 
@@ -48,14 +447,20 @@ class CoinutAPI():
         Returns:
             if pair argument is specified, return the pair's
             information in a dict; otherwise returns all spot trading
-            pairs' information
+            pairs' information. The instrument list is cached in memory
+            for INST_CACHE_TTL seconds and on disk for DISK_CACHE_TTL
+            seconds; call refresh_instruments to fetch it again
+            immediately.
 
         See also:
             https://github.com/coinut/api/wiki/Websocket-API#get-spot-trading-instruments
 
         '''
 
-        result = self.request("inst_list", {'sec_type': 'SPOT'})
+        result = self._cached_instruments()
+        if result is None:
+            result = self._store_instruments(self.request("inst_list", {'sec_type': 'SPOT'}))
+
         if pair != None:
             return result['SPOT'][pair][0]
         else:
@@ -132,6 +537,99 @@ class CoinutAPI():
         return self.request("inst_order_book", {"inst_id": inst_id})
 
 
+    def get_orderbook_np(self, inst_id):
+        '''Get a spot trading instrument's orderbook as numpy arrays.
+
+        The decimal strings are parsed by a Numba-compiled kernel when numba
+        is installed. numpy is required.
+
+        Args:
+            inst_id (int): the inst_id can be obtained using the
+            get_spot_inst_id or get_spot_instruments functions.
+
+        Returns:
+            a (bids, asks) tuple of float64 arrays of shape (N, 2) whose
+            columns are price and qty
+
+        Examples:
+            >>> c = CoinutAPI()
+            >>> bids, asks = c.get_orderbook_np(1)
+            >>> print asks[0]
+            [ 0.01311  0.002  ]
+
+        See also:
+            https://github.com/coinut/api/wiki/Websocket-API#get-orderbooks-in-realtime
+        '''
+
+        if np is None:
+            raise ImportError("get_orderbook_np requires numpy: pip install numpy")
+        book = self.get_orderbook(inst_id)
+        return _levels_to_array(book.get('buy', ())), _levels_to_array(book.get('sell', ()))
+
+
+    def iter_orderbook(self, inst_id):
+        '''Iterate over a spot trading instrument's orderbook levels.
+
+        When ijson is installed the response is parsed while it is being
+        received, so the whole orderbook is never held in memory.
+
+        Args:
+            inst_id (int): the inst_id can be obtained using the
+            get_spot_inst_id or get_spot_instruments functions.
+
+        Returns:
+            a generator of (side, price, qty) tuples where side is 'buy' or 'sell'
+
+        Raises:
+            ValueError: if the exchange replies with an error instead of
+            an orderbook; the exception carries the reply
+
+        Examples:
+            >>> c = CoinutAPI()
+            >>> for side, price, qty in c.iter_orderbook(1):
+            ...     print side, price, qty
+            sell 0.01311 0.00200000
+
+        See also:
+            https://github.com/coinut/api/wiki/Websocket-API#get-orderbooks-in-realtime
+        '''
+
+        if ijson is None or self._client is not None:
+            book = self.get_orderbook(inst_id)
+            _check_orderbook(book)
+            for side in ('buy', 'sell'):
+                for level in book.get(side, ()):
+                    yield side, level['price'], level['qty']
+            return
+
+        body = _dumps({'request': 'inst_order_book', 'inst_id': inst_id,
+                       'nonce': self._nonce()})
+        response = self._send(body, stream=True)
+        try:
+            response.raw.decode_content = True
+            level = {}
+            # the top-level fields other than the levels, to check the status
+            reply = {}
+            for prefix, event, value in ijson.parse(response.raw):
+                if prefix == '' and event == 'map_key' and value in ('buy', 'sell'):
+                    reply[value] = []  # its levels are yielded, not kept
+                elif prefix == 'status.item':
+                    reply.setdefault('status', []).append(value)
+                elif '.' not in prefix and event in ('string', 'number', 'boolean', 'null'):
+                    reply[prefix] = value
+                elif prefix in ('buy.item', 'sell.item'):
+                    if event == 'end_map':
+                        yield prefix[:-5], level.get('price'), level.get('qty')
+                        level = {}
+                elif prefix.startswith(('buy.item.', 'sell.item.')):
+                    field = prefix.rsplit('.', 1)[1]
+                    if field in ('price', 'qty'):
+                        level[field] = value
+        finally:
+            response.close()
+        _check_orderbook(reply)
+
+
     def get_inst_trades(self, inst_id):
         '''Get a spot trading instrument's recent trades.
 
@@ -176,6 +674,60 @@ class CoinutAPI():
         return self.request("user_open_orders", {"inst_id": inst_id})['orders']
 
 
+    def _fan_out(self, func, inst_ids, max_workers):
+        inst_ids = list(inst_ids)
+        max_workers = max(1, min(max_workers, self.POOL_MAXSIZE, len(inst_ids)))
+        with ThreadPoolExecutor(max_workers) as ex:
+            return dict(zip(inst_ids, ex.map(func, inst_ids)))
+
+
+    def get_ticks(self, inst_ids, max_workers = 16):
+        '''Get the last ticks of several instruments concurrently.
+
+        Args:
+            inst_ids (list of int): the instruments to query
+
+            max_workers (int): the maximum number of requests in flight
+
+        Returns:
+            a dict mapping each inst_id to its tick as returned by get_inst_tick
+
+        Examples:
+            >>> c = CoinutAPI()
+            >>> print c.get_ticks([1, 2])
+            {1: {u'last': u'0.01253000', ...}, 2: {...}}
+        '''
+        return self._fan_out(self.get_inst_tick, inst_ids, max_workers)
+
+
+    def get_orderbooks(self, inst_ids, max_workers = 16):
+        '''Get the orderbooks of several instruments concurrently.
+
+        Args:
+            inst_ids (list of int): the instruments to query
+
+            max_workers (int): the maximum number of requests in flight
+
+        Returns:
+            a dict mapping each inst_id to its orderbook as returned by get_orderbook
+        '''
+        return self._fan_out(self.get_orderbook, inst_ids, max_workers)
+
+
+    def get_all_open_orders(self, inst_ids, max_workers = 16):
+        '''Get my open orders on several instruments concurrently.
+
+        Args:
+            inst_ids (list of int): the instruments to query
+
+            max_workers (int): the maximum number of requests in flight
+
+        Returns:
+            a dict mapping each inst_id to its open orders as returned by get_open_orders
+        '''
+        return self._fan_out(self.get_open_orders, inst_ids, max_workers)
+
+
     def create_new_order(self, inst_id, side, qty, price = None, client_ord_id = None):
         '''Create a dict containing the information for opening a new order
 
@@ -194,23 +746,71 @@ class CoinutAPI():
         Returns:
             a dict containing the information for the new order
 
+        Raises:
+            ValueError: if inst_id, side, qty or price is invalid
+
         Examples:
             >>> c = CoinutAPI()
             >>> print c.create_new_order(1, 'BUY', 0.0000001, 0.013)
             {'price': '0.01300000', 'qty': '0.00000010', 'side': 'BUY', 'client_ord_id': 1170372055, 'inst_id': 1}
         '''
 
-        order = {'inst_id': inst_id, "side": side, 'qty': "%.8f" % qty}
+        _check_order(inst_id, side, qty, price)
+        if client_ord_id is None:
+            client_ord_id = randbits(32) % 4294967290 + 1
+        order = {'inst_id': inst_id, 'side': side, 'qty': format(qty, '.8f'),
+                 'client_ord_id': client_ord_id}
         if price is not None:
-            order['price'] = "%.8f" % price
-
-        if client_ord_id is not None:
-            order['client_ord_id'] = client_ord_id
-        else:
-            order['client_ord_id'] = random.randint(1, 4294967290)
+            order['price'] = format(price, '.8f')
         return order
 
 
+    def create_new_orders(self, inst_id, side, qtys, prices = None):
+        '''Create the dicts for a batch of orders on one instrument and side
+
+        Args:
+            inst_id (int): the inst_id can be obtained using the
+            get_spot_inst_id or get_spot_instruments functions.
+
+            side (str): either 'BUY' or 'SELL'. It's case sensitive.
+
+            qtys (list of float): the quantities of the orders. Any
+            iterable works, including numpy arrays.
+
+            prices (list of float): the limit prices matching qtys, one
+            per qty. Use None to create market orders.
+
+        Returns:
+            a list of orders which can be passed to submit_new_orders
+
+        Raises:
+            ValueError: if inst_id, side or any qty or price is invalid
+
+        Examples:
+            >>> c = CoinutAPI()
+            >>> print c.create_new_orders(1, 'BUY', [0.1, 0.2], [0.013, 0.012])
+            [{'inst_id': 1, 'side': 'BUY', 'qty': '0.10000000', 'client_ord_id': 3094617411, 'price': '0.01300000'}, ...]
+        '''
+
+        _check_order(inst_id, side, 1, None)
+        qtys = list(qtys)
+        if not all(_is_positive(q) for q in qtys):
+            raise ValueError("every qty must be finite and at least 0.00000001")
+        if prices is None:
+            return [{'inst_id': inst_id, 'side': side, 'qty': format(q, '.8f'),
+                     'client_ord_id': randbits(32) % 4294967290 + 1}
+                    for q in qtys]
+        prices = list(prices)
+        if len(prices) != len(qtys):
+            raise ValueError("got %d prices for %d qtys" % (len(prices), len(qtys)))
+        if not all(_is_positive(p) for p in prices):
+            raise ValueError("every price must be finite and at least 0.00000001")
+        return [{'inst_id': inst_id, 'side': side, 'qty': format(q, '.8f'),
+                 'client_ord_id': randbits(32) % 4294967290 + 1,
+                 'price': format(p, '.8f')}
+                for q, p in zip(qtys, prices)]
+
+
     def submit_new_order(self, inst_id, side, qty, price = None, client_ord_id = None):
         '''Submit an order to the exchange
 
@@ -252,6 +852,69 @@ class CoinutAPI():
         return self.request("new_orders", {"orders": ords})
 
 
+    def submit_new_order_batched(self, inst_id, side, qty, price = None, client_ord_id = None, flush_interval_ms = 50):
+        '''Queue an order and submit it together with other queued orders
+
+        Orders are sent in one new_orders request when MAX_ORDER_BATCH
+        orders are queued, when flush_interval_ms has passed since the
+        first queued order, or when flush is called.
+
+        Args:
+            inst_id, side, qty, price, client_ord_id: the same as submit_new_order.
+
+            flush_interval_ms (int): how long an order may wait in the
+            queue before the batch is submitted.
+
+        Returns:
+            a concurrent.futures.Future resolving to the exchange's reply
+            for this order. If the reply cannot be matched by
+            client_ord_id, the future gets the whole batch response.
+
+        Examples:
+            >>> c = CoinutAPI('your username', 'your REST API Key')
+            >>> f = c.submit_new_order_batched(1, 'BUY', 0.0000001, 0.012)
+            >>> print f.result()
+        '''
+
+        order = self.create_new_order(inst_id, side, qty, price, client_ord_id)
+        future = Future()
+        with self._pending_lock:
+            self._pending_orders.append((order, future))
+            full = len(self._pending_orders) >= self.MAX_ORDER_BATCH
+            if not full and self._flush_timer is None:
+                self._flush_timer = threading.Timer(flush_interval_ms / 1000.0, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+        if full:
+            self.flush()
+        return future
+
+
+    def flush(self):
+        '''Submit all orders queued by submit_new_order_batched'''
+
+        with self._pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            # orders whose futures were cancelled are dropped; the rest can
+            # no longer be cancelled once they are marked as running
+            pending = [(order, future) for order, future in self._pending_orders
+                       if future.set_running_or_notify_cancel()]
+            self._pending_orders.clear()
+
+        for i in range(0, len(pending), self.MAX_ORDER_BATCH):
+            batch = pending[i:i + self.MAX_ORDER_BATCH]
+            try:
+                result = self.submit_new_orders([order for order, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            _resolve_orders(batch, result)
+
+
     def cancel_order(self, inst_id, order_id):
         '''Cancel an order
 
@@ -288,6 +951,9 @@ class CoinutAPI():
         Returns:
             cancel results
 
+        Raises:
+            TypeError: if inst_id or any order id is not an integer
+
         Examples:
             >>> c = CoinutAPI('your username', 'your REST API Key')
             >>> print c.cancel_orders(1, [3355, 1345])
@@ -296,20 +962,334 @@ class CoinutAPI():
             https://github.com/coinut/api/wiki/Websocket-API#cancel-orders-in-batch-mode
         '''
 
-        ords = [{'inst_id': inst_id, 'order_id': x} for x in order_ids]
-        return self.request("cancel_orders", {'entries': ords})
+        # the payload has a fixed shape, so emit the JSON directly instead of
+        # building one dict per order and running it through the encoder.
+        # %d would silently truncate floats, so every id must be a real integer.
+        inst_id = operator.index(inst_id)
+        entries = b','.join(b'{"inst_id":%d,"order_id":%d}' % (inst_id, operator.index(x))
+                            for x in order_ids)
+        body = (b'{"request":"cancel_orders","entries":[' + entries +
+                b'],"nonce":%d}' % self._nonce())
+        return self._post(body)
+
+
+    def request(self, api, content = None):
+        # build a new dict so neither a shared default nor the caller's dict is mutated
+        if content:
+            payload = {**content, 'request': api, 'nonce': self._nonce()}
+        else:
+            payload = {'request': api, 'nonce': self._nonce()}
+        return self._post(_dumps(payload))
+
+
+    def _nonce(self):
+        return next(_nonce_counter) % 4294967200 + 1
+
+
+    def _post(self, body):
+        '''Sign the serialized request body, send it and parse the reply'''
+        return _loads(self._send(body).content)
+
+
+    def _send(self, body, stream = False):
+        '''Sign the serialized request body and send it
+
+        body must be bytes; the same object is hashed and handed to the
+        transport, so the payload is never copied or re-encoded.
+
+        With stream=True the response body is left unread so it can be
+        consumed incrementally; this is only supported without HTTP/2.
+        '''
+        headers, body = self._prepare(body)
+        if self._client is not None:
+            response = self._client.post(API_URL, headers=headers, content=body)
+        else:
+            response = self._session.post(API_URL, headers=headers, data=body,
+                                          timeout=5, stream=stream)
+        return response
+
+
+    def _prepare(self, body):
+        '''Apply the rate limit, sign and optionally compress body; return (headers, body)'''
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+        headers = self._sign(body)
+        if self._compress_requests and len(body) > self.COMPRESS_MIN_SIZE:
+            # level 1 already shrinks repetitive order JSON several times over
+            body = gzip.compress(body, compresslevel=1)
+            headers = {**(headers or {}), 'Content-Encoding': 'gzip'}
+        return headers, body
+
+
+    def _sign(self, body):
+        '''Return the per-request signature header for body, or None when unauthenticated'''
+        if self._hmac_template is None:
+            return None
+        mac = self._hmac_template.copy()
+        mac.update(body)
+        return {'X-SIGNATURE': mac.hexdigest()}
+
+
+
+
+class AsyncCoinutAPI(CoinutAPI):
+    '''asyncio version of CoinutAPI built on httpx.AsyncClient.
+
+    It has the same methods as CoinutAPI, but every method that talks to
+    the exchange or the disk cache is a coroutine. Inherited methods such
+    as get_balance or cancel_orders return an awaitable that resolves to
+    the reply documented on CoinutAPI. Requests share one connection pool,
+    so many of them can be in flight at once.
+
+    Examples:
+        >>> async def main():
+        ...     async with AsyncCoinutAPI('your username', 'your REST API Key') as c:
+        ...         print(await c.cancel_all({1: [3355, 1345], 2: [4711]}))
+        >>> asyncio.run(main())
+    '''
+
+    def _open_transport(self, headers, use_http2):
+        if httpx is None:
+            raise ImportError("AsyncCoinutAPI requires httpx: pip install httpx")
+        self._session = None
+        self._client = httpx.AsyncClient(
+            http2=use_http2,
+            headers=headers,
+            limits=httpx.Limits(max_connections=100,
+                                max_keepalive_connections=20),
+            timeout=5.0)
+        # the event loop only keeps weak references to tasks, so scheduled
+        # flushes are held here until they finish
+        self._flush_tasks = set()
+
+    async def close(self):
+        '''Submit any batched orders and close the underlying HTTP connections'''
+        await self.flush()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    def __enter__(self):
+        raise TypeError("use 'async with' with AsyncCoinutAPI")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def refresh_instruments(self):
+        '''Drop the cached instrument list so the next lookup fetches it again'''
+        await asyncio.get_running_loop().run_in_executor(None, CoinutAPI.refresh_instruments, self)
+
+    async def get_spot_instruments(self, pair = None):
+        '''Get spot trading instruments information
+
+        Args:
+            pair (str): it can be any spot trading pair like "BTCUSDT"
+            or "LTCBTC".
+
+        Returns:
+            if pair argument is specified, the pair's information in a
+            dict; otherwise all spot trading pairs' information. The list
+            is cached like in CoinutAPI.get_spot_instruments.
+
+        Examples:
+            >>> c = AsyncCoinutAPI()
+            >>> print(await c.get_spot_instruments('LTCBTC'))
+            {u'inst_id': 1, u'base': u'LTC', u'quote': u'BTC', ...}
+
+        See also:
+            https://github.com/coinut/api/wiki/Websocket-API#get-spot-trading-instruments
+        '''
+        # the disk cache is read and written in a worker thread so shelve
+        # never blocks the event loop; a filled memory cache needs no disk I/O
+        loop = asyncio.get_running_loop()
+        if self._inst_cache is not None:
+            result = self._cached_instruments()
+        else:
+            result = await loop.run_in_executor(None, self._cached_instruments)
+        if result is None:
+            reply = await self.request("inst_list", {'sec_type': 'SPOT'})
+            result = await loop.run_in_executor(None, self._store_instruments, reply)
+
+        if pair != None:
+            return result['SPOT'][pair][0]
+        else:
+            return result['SPOT']
+
+    async def get_spot_inst_id(self, pair):
+        '''Get a spot trading instrument's inst_id.
+
+        Args:
+            pair (str): it can be any spot trading pair like "BTCUSDT" or "LTCBTC".
+
+        Returns:
+            the spot trading pair's inst_id.
+
+        Examples:
+            >>> c = AsyncCoinutAPI()
+            >>> print(await c.get_spot_inst_id('LTCBTC'))
+            1
+        '''
+        return (await self.get_spot_instruments(pair))['inst_id']
+
+    async def get_orderbook_np(self, inst_id):
+        '''Get a spot trading instrument's orderbook as numpy arrays.
 
+        Args:
+            inst_id (int): the inst_id can be obtained using the
+            get_spot_inst_id or get_spot_instruments functions.
+
+        Returns:
+            a (bids, asks) tuple of float64 arrays of shape (N, 2) whose
+            columns are price and qty
+
+        Examples:
+            >>> c = AsyncCoinutAPI()
+            >>> bids, asks = await c.get_orderbook_np(1)
+        '''
+        if np is None:
+            raise ImportError("get_orderbook_np requires numpy: pip install numpy")
+        book = await self.get_orderbook(inst_id)
+        return _levels_to_array(book.get('buy', ())), _levels_to_array(book.get('sell', ()))
+
+    async def iter_orderbook(self, inst_id):
+        '''Iterate over a spot trading instrument's orderbook levels.
+
+        Unlike CoinutAPI.iter_orderbook the reply is not streamed; it is
+        parsed in full and then iterated.
+
+        Args:
+            inst_id (int): the inst_id can be obtained using the
+            get_spot_inst_id or get_spot_instruments functions.
+
+        Returns:
+            an async generator of (side, price, qty) tuples where side is
+            'buy' or 'sell'
 
-    def request(self, api, content = {}):
-        url = 'https://api.coinut.com'
-        content["request"] = api
-        content["nonce"] = random.randint(1, 4294967200)
-        content = json.dumps(content)
-        headers = {}
-        if self.api_key is not None and self.user is not None:
-            sig = hmac.new(self.api_key, msg=content,
-                           digestmod=hashlib.sha256).hexdigest()
-            headers = {'X-USER': self.user, "X-SIGNATURE": sig}
+        Raises:
+            ValueError: if the exchange replies with an error instead of
+            an orderbook; the exception carries the reply
 
-        response = requests.post(url, headers=headers, data=content, timeout=5)
-        return response.json()
+        Examples:
+            >>> c = AsyncCoinutAPI()
+            >>> async for side, price, qty in c.iter_orderbook(1):
+            ...     print(side, price, qty)
+            sell 0.01311 0.00200000
+        '''
+        book = await self.get_orderbook(inst_id)
+        _check_orderbook(book)
+        for side in ('buy', 'sell'):
+            for level in book.get(side, ()):
+                yield side, level['price'], level['qty']
+
+    async def get_open_orders(self, inst_id):
+        '''Get my open orders.
+
+        Args:
+            inst_id (int): the inst_id can be obtained using the
+            get_spot_inst_id or get_spot_instruments functions.
+
+        Returns:
+            my open orders for an instrument
+
+        Examples:
+            >>> c = AsyncCoinutAPI('your username', 'your REST API Key')
+            >>> print(await c.get_open_orders(1))
+            [{u'order_id': 1120194747, u'open_qty': u'37.08640000', u'price': u'0.01251000', ...
+        '''
+        return (await self.request("user_open_orders", {"inst_id": inst_id}))['orders']
+
+    async def _fan_out(self, func, inst_ids, max_workers):
+        inst_ids = list(inst_ids)
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def call(inst_id):
+            async with semaphore:
+                return await func(inst_id)
+
+        results = await asyncio.gather(*(call(x) for x in inst_ids))
+        return dict(zip(inst_ids, results))
+
+    async def cancel_all(self, orders):
+        '''Cancel orders on several instruments concurrently
+
+        Args:
+            orders (dict): maps each inst_id to a list of order ids to cancel
+
+        Returns:
+            a dict mapping each inst_id to its cancel_orders result
+
+        Examples:
+            >>> c = AsyncCoinutAPI('your username', 'your REST API Key')
+            >>> print(await c.cancel_all({1: [3355, 1345], 2: [4711]}))
+        '''
+        inst_ids = list(orders)
+        results = await asyncio.gather(*(self.cancel_orders(x, orders[x]) for x in inst_ids))
+        return dict(zip(inst_ids, results))
+
+    def submit_new_order_batched(self, inst_id, side, qty, price = None, client_ord_id = None, flush_interval_ms = 50):
+        '''Queue an order and submit it together with other queued orders
+
+        It must be called from a running event loop. The batch is sent
+        when MAX_ORDER_BATCH orders are queued, when flush_interval_ms has
+        passed since the first queued order, or when flush is awaited.
+
+        Args:
+            inst_id, side, qty, price, client_ord_id: the same as submit_new_order.
+
+            flush_interval_ms (int): how long an order may wait in the
+            queue before the batch is submitted.
+
+        Returns:
+            an asyncio.Future resolving to the exchange's reply for this
+            order. If the reply cannot be matched by client_ord_id, the
+            future gets the whole batch response.
+
+        Examples:
+            >>> c = AsyncCoinutAPI('your username', 'your REST API Key')
+            >>> print(await c.submit_new_order_batched(1, 'BUY', 0.0000001, 0.012))
+        '''
+        order = self.create_new_order(inst_id, side, qty, price, client_ord_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_orders.append((order, future))
+        # the scheduled flush sends everything queued by the time it runs,
+        # so one task per full batch is enough
+        if len(self._pending_orders) % self.MAX_ORDER_BATCH == 0:
+            self._schedule_flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(flush_interval_ms / 1000.0,
+                                                self._schedule_flush)
+        return future
+
+    def _schedule_flush(self):
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        '''Submit all orders queued by submit_new_order_batched'''
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        pending = [(order, future) for order, future in self._pending_orders
+                   if not future.cancelled()]
+        self._pending_orders.clear()
+
+        for i in range(0, len(pending), self.MAX_ORDER_BATCH):
+            batch = pending[i:i + self.MAX_ORDER_BATCH]
+            try:
+                result = await self.submit_new_orders([order for order, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            _resolve_orders(batch, result)
+
+    async def _post(self, body):
+        headers, body = self._prepare(body)
+        response = await self._client.post(API_URL, headers=headers, content=body)
+        return _loads(response.content)
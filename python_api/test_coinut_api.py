@@ -0,0 +1,294 @@
+import asyncio
+import gzip
+import io
+import json
+import unittest
+
+try:
+    import coinut_api
+except ImportError:
+    coinut_api = None
+
+
+class FakeRaw(io.BytesIO):
+    decode_content = False
+
+
+class FakeResponse():
+
+    def __init__(self, reply):
+        self.content = json.dumps(reply).encode('utf-8')
+        self.raw = FakeRaw(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession():
+    '''Stands in for requests.Session; replies are produced by handler(request)'''
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    def post(self, url, headers = None, data = None, timeout = None, stream = False):
+        request = json.loads(data)
+        self.requests.append(request)
+        return FakeResponse(self.handler(request))
+
+    def close(self):
+        pass
+
+
+class FakeAsyncClient():
+    '''Stands in for httpx.AsyncClient; replies are produced by handler(request)'''
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    async def post(self, url, headers = None, content = None):
+        request = json.loads(content)
+        self.requests.append(request)
+        return FakeResponse(self.handler(request))
+
+    async def aclose(self):
+        pass
+
+
+def accept_orders(request):
+    '''Reply to new_orders like the exchange, in reverse order to exercise matching'''
+    return [{'reply': 'order_accepted', 'client_ord_id': order['client_ord_id']}
+            for order in reversed(request['orders'])]
+
+
+def fail(request):
+    raise RuntimeError('exchange unreachable')
+
+
+def fake_client(handler, **kwargs):
+    c = coinut_api.CoinutAPI('user', 'key', cache_dir=None, **kwargs)
+    c._session = FakeSession(handler)
+    return c
+
+
+@unittest.skipIf(coinut_api is None, 'requests is not installed')
+class OrderValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.c = coinut_api.CoinutAPI(cache_dir=None)
+
+    def test_valid_order(self):
+        order = self.c.create_new_order(1, 'BUY', 0.00000001, 0.013, 5)
+        self.assertEqual(order, {'inst_id': 1, 'side': 'BUY', 'qty': '0.00000001',
+                                 'price': '0.01300000', 'client_ord_id': 5})
+
+    def test_invalid_inst_id(self):
+        for inst_id in (0, -1, 1.5, True, '1', None):
+            with self.assertRaises(ValueError):
+                self.c.create_new_order(inst_id, 'BUY', 1)
+
+    def test_invalid_side(self):
+        with self.assertRaises(ValueError):
+            self.c.create_new_order(1, 'buy', 1)
+
+    def test_invalid_qty_and_price(self):
+        for qty in (0, -1, 1e-9, float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                self.c.create_new_order(1, 'BUY', qty)
+        for price in (0, -1, 1e-9, float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                self.c.create_new_order(1, 'BUY', 1, price)
+
+    def test_invalid_batch(self):
+        with self.assertRaises(ValueError):
+            self.c.create_new_orders(1, 'BUY', [1, float('inf')])
+        with self.assertRaises(ValueError):
+            self.c.create_new_orders(1, 'BUY', [1, 1], [1, 1e-9])
+        with self.assertRaises(ValueError):
+            self.c.create_new_orders(1, 'BUY', [0.1, 0.2, 0.3], [0.01])
+
+
+@unittest.skipIf(coinut_api is None, 'requests is not installed')
+class RateLimitTest(unittest.TestCase):
+
+    def test_burst_then_reject(self):
+        bucket = coinut_api._TokenBucket(2)
+        bucket.acquire()
+        bucket.acquire()
+        with self.assertRaises(coinut_api.RateLimitError):
+            bucket.acquire()
+
+    def test_rate_below_one(self):
+        bucket = coinut_api._TokenBucket(0.5)
+        bucket.acquire()
+        with self.assertRaises(coinut_api.RateLimitError):
+            bucket.acquire()
+
+    def test_refill(self):
+        bucket = coinut_api._TokenBucket(1)
+        bucket.acquire()
+        bucket.updated -= 1
+        bucket.acquire()
+
+    def test_invalid_rate_limit(self):
+        for rate in (0, -1):
+            with self.assertRaises(ValueError):
+                coinut_api.CoinutAPI(cache_dir=None, rate_limit=rate)
+
+
+@unittest.skipIf(coinut_api is None, 'requests is not installed')
+class OrderbookTest(unittest.TestCase):
+
+    def test_iter_orderbook(self):
+        book = {'status': ['OK'], 'nonce': 1,
+                'buy': [{'price': '0.01250', 'qty': '1.00000000', 'count': 1}],
+                'sell': [{'price': '0.01311', 'qty': '0.00200000', 'count': 1}]}
+        c = fake_client(lambda request: book)
+        self.assertEqual(list(c.iter_orderbook(1)),
+                         [('buy', '0.01250', '1.00000000'),
+                          ('sell', '0.01311', '0.00200000')])
+
+    def test_iter_orderbook_error(self):
+        error = {'status': ['INVALID_INSTRUMENT'], 'nonce': 1}
+        c = fake_client(lambda request: error)
+        with self.assertRaises(ValueError) as cm:
+            list(c.iter_orderbook(1))
+        self.assertEqual(cm.exception.args[0]['status'], ['INVALID_INSTRUMENT'])
+
+
+@unittest.skipIf(coinut_api is None or coinut_api.np is None, 'numpy is not installed')
+class ParseDecimalsTest(unittest.TestCase):
+
+    # strings in the shape the exchange sends them
+    VALUES = ['0.01311', '0.00200000', '18775.86604171', '63.51457338',
+              '0.00154154', '37.08640000', '0.01251000', '1', '12.5', '.5',
+              '3.', '0', '99999999.9999999', '999999999999999']
+
+    def parse(self, strings):
+        buf = ','.join(strings).encode('ascii')
+        return coinut_api._parse_decimals(coinut_api.np.frombuffer(buf, coinut_api.np.uint8),
+                                          len(strings))
+
+    def test_matches_float(self):
+        values, ok = self.parse(self.VALUES)
+        self.assertTrue(ok)
+        self.assertEqual(list(values), [float(x) for x in self.VALUES])
+
+    def test_rejects_what_it_cannot_parse(self):
+        for bad in (['1e-08'], ['-1'], ['+1'], ['1.2.3'], [''], ['1', ''],
+                    ['nan'], ['1234567890123456']):
+            self.assertFalse(self.parse(bad)[1], bad)
+        buf = coinut_api.np.frombuffer(b'1,2,3', coinut_api.np.uint8)
+        self.assertFalse(coinut_api._parse_decimals(buf, 2)[1])
+
+    def test_levels_to_array(self):
+        levels = [{'price': p, 'qty': q} for p, q in
+                  [('0.01311', '0.00200000'), ('1e-08', '5'), ('18775.86604171', '-1')]]
+        array = coinut_api._levels_to_array(levels)
+        self.assertEqual(array.shape, (3, 2))
+        self.assertEqual(array.tolist(), [[0.01311, 0.002], [1e-08, 5.0], [18775.86604171, -1.0]])
+        with self.assertRaises(ValueError):
+            coinut_api._levels_to_array([{'price': 'abc', 'qty': '1'}])
+
+
+@unittest.skipIf(coinut_api is None, 'requests is not installed')
+class BatchedOrdersTest(unittest.TestCase):
+
+    def submit(self, c, n, flush_interval_ms = 60000):
+        return [c.submit_new_order_batched(1, 'BUY', 1, 0.01, client_ord_id=i + 1,
+                                           flush_interval_ms=flush_interval_ms)
+                for i in range(n)]
+
+    def test_flush_by_timer(self):
+        c = fake_client(accept_orders)
+        futures = self.submit(c, 2, flush_interval_ms=10)
+        self.assertEqual([f.result(timeout=5)['client_ord_id'] for f in futures], [1, 2])
+        self.assertEqual(len(c._session.requests), 1)
+
+    def test_flush_when_full(self):
+        c = fake_client(accept_orders)
+        futures = self.submit(c, 2500)
+        self.assertEqual([len(r['orders']) for r in c._session.requests], [1000, 1000])
+        self.assertTrue(all(f.done() for f in futures[:2000]))
+        self.assertFalse(any(f.done() for f in futures[2000:]))
+        c.flush()
+        self.assertEqual([len(r['orders']) for r in c._session.requests], [1000, 1000, 500])
+        self.assertEqual([f.result()['client_ord_id'] for f in futures], list(range(1, 2501)))
+
+    def test_cancelled_future(self):
+        c = fake_client(accept_orders)
+        f1, f2 = self.submit(c, 2)
+        f1.cancel()
+        c.flush()
+        self.assertEqual([o['client_ord_id'] for o in c._session.requests[0]['orders']], [2])
+        self.assertEqual(f2.result(timeout=0)['client_ord_id'], 2)
+
+    def test_error(self):
+        c = fake_client(fail)
+        futures = self.submit(c, 2)
+        c.flush()
+        for f in futures:
+            self.assertIsInstance(f.exception(timeout=0), RuntimeError)
+
+
+@unittest.skipIf(coinut_api is None or coinut_api.httpx is None, 'httpx is not installed')
+class AsyncBatchedOrdersTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.c = coinut_api.AsyncCoinutAPI('user', 'key', cache_dir=None)
+        self.c._client = FakeAsyncClient(accept_orders)
+
+    def submit(self, n, flush_interval_ms = 60000):
+        return [self.c.submit_new_order_batched(1, 'BUY', 1, 0.01, client_ord_id=i + 1,
+                                                flush_interval_ms=flush_interval_ms)
+                for i in range(n)]
+
+    async def test_flush_by_timer(self):
+        futures = self.submit(2, flush_interval_ms=10)
+        replies = await asyncio.wait_for(asyncio.gather(*futures), 5)
+        self.assertEqual([r['client_ord_id'] for r in replies], [1, 2])
+        self.assertEqual(len(self.c._client.requests), 1)
+
+    async def test_flush_when_full(self):
+        # the flush scheduled by the full batch sends everything queued
+        # before it runs, split into batches of at most 1000
+        futures = self.submit(2500)
+        await asyncio.wait_for(asyncio.gather(*futures), 5)
+        self.assertEqual([len(r['orders']) for r in self.c._client.requests], [1000, 1000, 500])
+        self.assertEqual([f.result()['client_ord_id'] for f in futures], list(range(1, 2501)))
+        self.assertEqual(self.c._flush_tasks, set())
+
+    async def test_cancelled_future(self):
+        f1, f2 = self.submit(2)
+        f1.cancel()
+        await self.c.flush()
+        self.assertEqual([o['client_ord_id'] for o in self.c._client.requests[0]['orders']], [2])
+        self.assertEqual(f2.result()['client_ord_id'], 2)
+
+    async def test_error(self):
+        self.c._client.handler = fail
+        futures = self.submit(2)
+        await self.c.flush()
+        for f in futures:
+            self.assertIsInstance(f.exception(), RuntimeError)
+
+
+@unittest.skipIf(coinut_api is None, 'requests is not installed')
+class CompressionTest(unittest.TestCase):
+
+    def test_large_bodies_are_gzipped(self):
+        c = coinut_api.CoinutAPI('user', 'key', cache_dir=None, compress_requests=True)
+        body = b'{"request":"new_orders","orders":[' + b'{"qty":"1.00000000"},' * 100 + b'{}]}'
+        headers, sent = c._prepare(body)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['X-SIGNATURE'], c._sign(body)['X-SIGNATURE'])
+        self.assertEqual(gzip.decompress(sent), body)
+
+    def test_small_bodies_are_not(self):
+        c = coinut_api.CoinutAPI(cache_dir=None, compress_requests=True)
+        self.assertEqual(c._prepare(b'{}'), (None, b'{}'))
+
+
+if __name__ == '__main__':
+    unittest.main()